@@ -1,15 +1,34 @@
+import io
 import os
+import time
+import logging
+import atexit
+import threading
+import orjson
+import requests
 import spotipy
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from functools import lru_cache, partial
+from types import MappingProxyType
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from spotipy.oauth2 import SpotifyOAuth
+from authlib.integrations.base_client import OAuthError
 from authlib.integrations.flask_client import OAuth
-from flask import Flask, redirect, request, session, url_for
+from flask import Flask, Response, g, redirect, request, session, stream_with_context, url_for
+from flask.json.provider import JSONProvider
+from werkzeug.routing import BaseConverter
 from spotify_api_services import (
-    get_user, get_user_playlists, get_playlist, get_playlist_items,
-    get_playlist_cover_image, get_track, get_several_tracks, get_saved_tracks,
+    get_user, get_user_playlists, get_playlist, get_playlist_snapshot_id, iter_playlist_items,
+    get_playlist_cover_image, get_track, get_several_tracks, iter_saved_tracks,
     get_several_audio_features, get_track_audio_features,
     get_track_audio_analysis, get_user_top_items, get_followed_artists,
 )
+from login_middleware import LoginRequiredMiddleware
+from response_cache import TTLCache, cached_route
+from spotify_token import SpotifyToken
 from spotify_utils import (
     print_playlist_structure, print_playlist_items_structure, print_cover_image_structure, print_structure
 )
@@ -17,159 +36,339 @@ from spotify_utils import (
 # Load environment variables from .env file
 load_dotenv()
 
+# Accept non-string dict keys like the stdlib json module does, rather than raising
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+class OrjsonProvider(JSONProvider):
+    """
+    A JSON provider that serializes responses with orjson instead of the stdlib json module.
+    """
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of decoding them to str and back
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=ORJSON_OPTIONS), mimetype='application/json')
+
+class SpotifyIdConverter(BaseConverter):
+    """
+    Matches base-62 Spotify IDs, so malformed IDs get a 404 without reaching a view.
+    """
+    regex = r'[0-9A-Za-z]{22}'
+
+class TopTypeConverter(BaseConverter):
+    """
+    Matches the item types accepted by the user's top items endpoint.
+    """
+    regex = r'tracks|artists'
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Serve /user/ and /user alike instead of redirecting between them
+app.url_map.strict_slashes = False
+app.url_map.converters['sid'] = SpotifyIdConverter
+app.url_map.converters['toptype'] = TopTypeConverter
 
 # Use the secret key from the .env file
 app.secret_key = os.getenv('APP_SECRET_KEY')
 
+def save_token_to_session(token, refresh_token=None, access_token=None):
+    if not isinstance(token, SpotifyToken):
+        token = SpotifyToken.from_mapping(token)
+    session['spotify_token'] = asdict(token)
+    g.spotify_token = token
+
+def load_token_from_session():
+    # Parsed once per request and kept current by save_token_to_session
+    if 'spotify_token' not in g:
+        token_info = session.get('spotify_token')
+        g.spotify_token = SpotifyToken.from_mapping(token_info) if token_info else None
+    return g.spotify_token
+
+# Spotify's OAuth endpoints and the scopes the app requests
+SPOTIFY_OAUTH_KWARGS = MappingProxyType({
+    'access_token_url': 'https://accounts.spotify.com/api/token',
+    'access_token_params': None,
+    'authorize_url': 'https://accounts.spotify.com/authorize',
+    'authorize_params': None,
+    'api_base_url': 'https://api.spotify.com/v1/',
+    'client_kwargs': {'scope': 'playlist-read-private playlist-read-collaborative user-top-read user-follow-read user-library-read'},
+})
+
 oauth = OAuth(app)
 spotify = oauth.register(
     name='spotify',
     client_id=os.getenv('SPOTIFY_CLIENT_ID'),
     client_secret=os.getenv('SPOTIFY_CLIENT_SECRET'),
-    access_token_url='https://accounts.spotify.com/api/token',
-    access_token_params=None,
-    authorize_url='https://accounts.spotify.com/authorize',
-    authorize_params=None,
-    api_base_url='https://api.spotify.com/v1/',
-    client_kwargs={'scope': 'playlist-read-private playlist-read-collaborative user-top-read user-follow-read user-library-read'},
+    update_token=save_token_to_session,
+    **SPOTIFY_OAUTH_KWARGS,
 )
 
+# One pooled HTTP session shared by every Spotipy client, so API calls reuse
+# open TLS connections instead of handshaking on every request
+http_session = requests.Session()
+http_session.mount('https://', HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+app.extensions['spotify_http_session'] = http_session
+atexit.register(http_session.close)
+
+# Tokens this close to expiry (in seconds) are refreshed in the background
+TOKEN_REFRESH_MARGIN = 60
+
+# Background refreshes keyed by refresh token, so each user has at most one in flight
+token_refresh_executor = ThreadPoolExecutor(max_workers=1)
+pending_token_refreshes = {}
+pending_token_refreshes_lock = threading.Lock()
+
+# Finished refreshes, kept briefly for the user's next request to pick up
+refreshed_tokens = TTLCache(timeout=300, maxsize=256)
+
+# Endpoints that can be reached without logging in to Spotify
+PUBLIC_ENDPOINTS = {'index', 'login', 'authorize', 'static'}
+
+# Turn logged-out requests away before Flask dispatches them
+app.wsgi_app = LoginRequiredMiddleware(app.wsgi_app, app, PUBLIC_ENDPOINTS)
+
+# Encoded playlist items keyed by (playlist ID, snapshot ID), so unchanged playlists
+# aren't re-fetched or re-encoded, capped in total bytes per worker
+playlist_items_cache = TTLCache(timeout=3600, maxsize=64, maxbytes=32 * 1024 * 1024)
+
+# Query string values that turn a flag such as ?refresh on
+TRUTHY_ARGS = {'1', 'true', 'yes', 'on'}
+
+# Pool for work that shouldn't block a response
+background_executor = ThreadPoolExecutor(max_workers=2)
+app.extensions['background_executor'] = background_executor
+
+@lru_cache(maxsize=32)
+def cached_url_for(endpoint, url_root, external=False):
+    # url_root only keys the cache, since the built URL depends on the request's host and script root
+    return url_for(endpoint, _external=external)
+
 @app.route('/')
 def index():
-    return redirect(url_for('login'))
+    return redirect(cached_url_for('login', request.url_root))
 
 @app.route('/login')
 def login():
-    redirect_uri = url_for('authorize', _external=True)
+    redirect_uri = cached_url_for('authorize', request.url_root, external=True)
     return spotify.authorize_redirect(redirect_uri)
 
 @app.route('/authorize')
 def authorize():
     token_info = spotify.authorize_access_token()
-    sp = spotipy.Spotify(auth=token_info['access_token'])
+    save_token_to_session(token_info)
+    sp = create_spotify_client()
 
-    # Fetch and print all Spotify data
-    fetch_and_print_spotify_data(sp)
+    # Fetch and log all Spotify data when debugging, without holding up the login response
+    if app.logger.isEnabledFor(logging.DEBUG):
+        background_executor.submit(fetch_and_print_spotify_data, sp)
 
     profile = sp.current_user()
     return 'Logged in as ' + profile['id']
 
-# @app.route('/authorize')
-# def authorize():
-#     token_info = spotify.authorize_access_token()
-    
-#     # Creating a Spotipy client with the access token
-#     sp = spotipy.Spotify(auth=token_info['access_token'])
-
-#     # Fetch and log the user's playlists
-#     playlists = sp.current_user_playlists()
-#     while playlists:
-#         for i, playlist in enumerate(playlists['items']):
-#             print(f"{i + playlists['offset']} - {playlist['name']}")
-#         if playlists['next']:
-#             playlists = sp.next(playlists)
-#         else:
-#             playlists = None
-    
-#     # Example of using a function from spotify_utils
-#     playlists = get_playlist_items(sp, 'some_playlist_id')
-
-#     profile = sp.current_user()
-#     # Do something with the profile, e.g., store in session or database
-#     return 'Logged in as ' + profile['id']
-
 @app.route('/user')
+@cached_route(timeout=30)
 def user():
-    sp = create_spotify_client()
-    user_info = get_user(sp)
+    user_info = get_user(g.sp)
     return user_info
 
 @app.route('/user/playlists')
+@cached_route(timeout=30)
 def user_playlists():
-    sp = create_spotify_client()
-    playlists = get_user_playlists(sp)
+    playlists = get_user_playlists(g.sp)
     return {"playlists": playlists}
 
-@app.route('/playlist/<playlist_id>')
+@app.route('/playlist/<sid:playlist_id>')
+@cached_route(timeout=30)
 def playlist(playlist_id):
-    sp = create_spotify_client()
-    playlist_info = get_playlist(sp, playlist_id)
+    playlist_info = get_playlist(g.sp, playlist_id)
     return playlist_info
 
-@app.route('/playlist/<playlist_id>/items')
+@app.route('/playlist/<sid:playlist_id>/items')
 def playlist_items(playlist_id):
-    sp = create_spotify_client()
-    items = get_playlist_items(sp, playlist_id)
-    return {"items": items}
-
-@app.route('/playlist/<playlist_id>/cover')
+    # The snapshot ID lookup also checks the user can read the playlist before serving cached items
+    key = (playlist_id, get_playlist_snapshot_id(g.sp, playlist_id))
+    if request.args.get('refresh', '').lower() not in TRUTHY_ARGS:
+        body = playlist_items_cache.get(key)
+        if body is not None:
+            return Response(body, mimetype='application/x-ndjson')
+    # Stream one JSON item per line as pages arrive, rather than buffering the whole playlist
+    lines = cache_when_exhausted(stream_ndjson(iter_playlist_items(g.sp, playlist_id)), playlist_items_cache, key)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+@app.route('/playlist/<sid:playlist_id>/cover')
+@cached_route(timeout=30)
 def playlist_cover(playlist_id):
-    sp = create_spotify_client()
-    cover_image = get_playlist_cover_image(sp, playlist_id)
+    cover_image = get_playlist_cover_image(g.sp, playlist_id)
     return {"cover_image": cover_image}
 
-@app.route('/track/<track_id>')
+@app.route('/track/<sid:track_id>')
 def track(track_id):
-    sp = create_spotify_client()
-    track_info = get_track(sp, track_id)
+    track_info = get_track(g.sp, track_id)
     return track_info
 
 @app.route('/tracks')
 def several_tracks():
-    sp = create_spotify_client()
     # Assuming track IDs are passed as query parameters
     track_ids = request.args.getlist('ids')
-    tracks_info = get_several_tracks(sp, track_ids)
+    tracks_info = get_several_tracks(g.sp, track_ids)
     return {"tracks": tracks_info}
 
 @app.route('/user/saved_tracks')
 def saved_tracks():
-    sp = create_spotify_client()
-    tracks = get_saved_tracks(sp)
-    return {"saved_tracks": tracks}
+    # Saved libraries can run to thousands of tracks, so stream them like playlist items
+    tracks = iter_saved_tracks(g.sp)
+    return Response(stream_with_context(stream_ndjson(tracks)), mimetype='application/x-ndjson')
 
 @app.route('/audio_features')
 def audio_features():
-    sp = create_spotify_client()
     # Assuming track IDs are passed as query parameters
     track_ids = request.args.getlist('ids')
-    features = get_several_audio_features(sp, track_ids)
+    features = get_several_audio_features(g.sp, track_ids)
     return {"audio_features": features}
 
-@app.route('/track/<track_id>/audio_features')
+@app.route('/track/<sid:track_id>/audio_features')
 def track_audio_features(track_id):
-    sp = create_spotify_client()
-    features = get_track_audio_features(sp, track_id)
+    features = get_track_audio_features(g.sp, track_id)
     return {"audio_features": features}
 
-@app.route('/track/<track_id>/audio_analysis')
+@app.route('/track/<sid:track_id>/audio_analysis')
 def track_audio_analysis(track_id):
-    sp = create_spotify_client()
-    analysis = get_track_audio_analysis(sp, track_id)
+    analysis = get_track_audio_analysis(g.sp, track_id)
     return analysis
 
-@app.route('/user/top/<type>')
+@app.route('/user/top/<toptype:type>')
+@cached_route(timeout=30)
 def user_top_items(type):
-    sp = create_spotify_client()
-    top_items = get_user_top_items(sp, type)
+    top_items = get_user_top_items(g.sp, type)
     return {"top_items": top_items}
 
 @app.route('/user/followed_artists')
+@cached_route(timeout=30)
 def followed_artists():
-    sp = create_spotify_client()
-    artists = get_followed_artists(sp)
+    artists = get_followed_artists(g.sp)
     return {"followed_artists": artists}
 
+@app.before_request
+def apply_refreshed_token():
+    token = load_token_from_session()
+    if token is None or token.refresh_token is None:
+        return
+    new_token = refreshed_tokens.get(token.refresh_token)
+    if new_token is not None and new_token.access_token != token.access_token:
+        save_token_to_session(new_token)
+
+@app.before_request
+def load_spotify_client():
+    # Every route other than the login flow needs a Spotify client
+    if request.endpoint is None or request.endpoint in PUBLIC_ENDPOINTS:
+        return
+    g.sp = create_spotify_client()
+    if g.sp is None:
+        return redirect(cached_url_for('login', request.url_root))
+
+@app.after_request
+def add_conditional_headers(response):
+    # Let browsers revalidate unchanged JSON with If-None-Match and get an empty 304 back
+    if request.method != 'GET' or response.status_code != 200 or response.is_streamed:
+        return response
+    response.add_etag()
+    # The data belongs to the logged-in user, so shared caches must not keep it
+    response.cache_control.private = True
+    return response.make_conditional(request)
+
+def refresh_token(token):
+    new_token = SpotifyToken.from_mapping(spotify.fetch_access_token(
+        grant_type='refresh_token', refresh_token=token.refresh_token))
+    # Spotify only sometimes rotates the refresh token
+    if new_token.refresh_token is None:
+        new_token.refresh_token = token.refresh_token
+    return new_token
+
+def schedule_token_refresh(token):
+    with pending_token_refreshes_lock:
+        if token.refresh_token in pending_token_refreshes:
+            return
+        future = token_refresh_executor.submit(refresh_token, token)
+        pending_token_refreshes[token.refresh_token] = future
+    # Added outside the lock, since it runs right away if the refresh has already finished
+    future.add_done_callback(partial(finish_token_refresh, token.refresh_token))
+
+def finish_token_refresh(key, future):
+    error = future.exception()
+    if error is None:
+        refreshed_tokens.set(key, future.result())
+    else:
+        app.logger.warning('Background Spotify token refresh failed', exc_info=error)
+    with pending_token_refreshes_lock:
+        del pending_token_refreshes[key]
+
 def create_spotify_client():
-    token_info = spotify.authorize_access_token()
-    return spotipy.Spotify(auth=token_info['access_token'])
+    token = load_token_from_session()
+    if token is None:
+        return None
+    if token.refresh_token and token.expires_at:
+        expires_in = token.expires_at - time.time()
+        if expires_in <= 0:
+            # Already expired, so the refresh has to happen before this request
+            try:
+                token = refresh_token(token)
+            except OAuthError:
+                session.pop('spotify_token', None)
+                g.spotify_token = None
+                return None
+            save_token_to_session(token)
+        elif expires_in < TOKEN_REFRESH_MARGIN:
+            schedule_token_refresh(token)
+    return make_spotify_client(token.access_token)
+
+class SharedSessionSpotify(spotipy.Spotify):
+    """
+    A Spotify client that uses, but does not own, the shared http_session.
+
+    Spotipy closes its requests session when a client is garbage collected, which
+    would drop the pooled connections every other client is still using.
+    """
+    def __del__(self):
+        pass
+
+@lru_cache(maxsize=128)
+def make_spotify_client(access_token):
+    # Clients hold no per-request state, so one per access token is reused across requests
+    return SharedSessionSpotify(auth=access_token, requests_session=http_session)
+
+def cache_when_exhausted(chunks, cache, key):
+    collected = []
+    size = 0
+    for chunk in chunks:
+        if collected is not None:
+            collected.append(chunk)
+            size += len(chunk)
+            # Too big to be cached, so stop holding on to what has been streamed
+            if cache.maxbytes is not None and size > cache.maxbytes:
+                collected = None
+        yield chunk
+    if collected is not None:
+        cache.set(key, b''.join(collected))
+
+def stream_ndjson(items):
+    for item in items:
+        yield orjson.dumps(item, option=ORJSON_OPTIONS) + b'\n'
 
 def fetch_and_print_spotify_data(sp):
     # User Profile
     user_info = get_user(sp)
-    print("User Info:", user_info)
-    # Prints: 
+    app.logger.debug("User Info: %s", user_info)
+    # Logs:
     # User Info: {'display_name': 'mlgprettyboi', 'external_urls': 
     # {'spotify': 'https://open.spotify.com/user/mlgprettyboi'}, 'href': 
     # 'https://api.spotify.com/v1/users/mlgprettyboi', 'id': 'mlgprettyboi', 
@@ -211,7 +410,9 @@ def fetch_and_print_spotify_data(sp):
     # User's Top Items (Tracks and Artists)
     top_tracks = get_user_top_items(sp, 'tracks')
     # print("\nTop Tracks:", top_tracks)
-    print_structure(top_tracks)
+    structure = io.StringIO()
+    print_structure(top_tracks, file=structure)
+    app.logger.debug("Top Tracks:\n%s", structure.getvalue())
     # top_artists = get_user_top_items(sp, 'artists')
     # print("\nTop Artists:", top_artists)
 
@@ -229,6 +430,3 @@ def fetch_and_print_spotify_data(sp):
     #     print(f"\nAudio Features for {track_id}:", track_audio_features)
     #     track_audio_analysis = get_track_audio_analysis(sp, track_id)
     #     print(f"\nAudio Analysis for {track_id}:", track_audio_analysis)
-
-if __name__ == '__main__':
-    app.run(debug=True)
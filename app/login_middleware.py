@@ -0,0 +1,71 @@
+from itsdangerous import BadSignature
+from werkzeug.http import parse_cookie
+from werkzeug.utils import redirect
+
+class LoginRequiredMiddleware:
+    """
+    WSGI middleware that redirects requests with no Spotify token to /login.
+
+    The session cookie is verified and decoded directly, so logged-out requests
+    are answered before Flask builds a request context, matches the URL or runs
+    any view code.
+
+    Parameters:
+    - wsgi_app (callable): The WSGI application being wrapped.
+    - app (Flask): The Flask app whose session cookie settings and URL map are used.
+    - public_endpoints (set): Endpoints that are reachable without logging in.
+    """
+    def __init__(self, wsgi_app, app, public_endpoints):
+        self.wsgi_app = wsgi_app
+        self.app = app
+        self.public_endpoints = public_endpoints
+        self._public_paths = None
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '').rstrip('/') or '/'
+        if self.is_public(path) or self.has_token(environ):
+            return self.wsgi_app(environ, start_response)
+        response = redirect(environ.get('SCRIPT_NAME', '') + '/login')
+        return response(environ, start_response)
+
+    def is_public(self, path):
+        if self._public_paths is None:
+            # Routes are registered after the middleware is installed, so read them on first use
+            self._public_paths = self.read_public_paths()
+        paths, prefixes = self._public_paths
+        return path in paths or path.startswith(prefixes)
+
+    def read_public_paths(self):
+        """
+        Collects the paths of the public endpoints from the app's URL map.
+
+        Returns:
+        - tuple: The set of exact paths, and a tuple of path prefixes for rules
+          with variables (such as /static/<path:filename>), matched on the part
+          before the first variable.
+        """
+        paths = set()
+        prefixes = []
+        for rule in self.app.url_map.iter_rules():
+            if rule.endpoint not in self.public_endpoints:
+                continue
+            if rule.arguments:
+                prefixes.append(rule.rule.split('<', 1)[0])
+            else:
+                paths.add(rule.rule.rstrip('/') or '/')
+        return paths, tuple(prefixes)
+
+    def has_token(self, environ):
+        session_interface = self.app.session_interface
+        serializer = session_interface.get_signing_serializer(self.app)
+        if serializer is None:
+            # Without a secret key there is no session to check, so leave it to Flask
+            return True
+        value = parse_cookie(environ.get('HTTP_COOKIE', '')).get(session_interface.get_cookie_name(self.app))
+        if not value:
+            return False
+        max_age = int(self.app.permanent_session_lifetime.total_seconds())
+        try:
+            return 'spotify_token' in serializer.loads(value, max_age=max_age)
+        except BadSignature:
+            return False
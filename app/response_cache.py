@@ -0,0 +1,92 @@
+import time
+import threading
+from functools import wraps
+from flask import g, request
+
+class TTLCache:
+    """
+    A thread-safe in-memory cache whose entries expire after a fixed time.
+
+    Parameters:
+    - timeout (int): Seconds an entry stays valid.
+    - maxsize (int): Number of entries kept before the oldest are evicted.
+    - maxbytes (int): Total length of the cached values, if limited. Values must then
+      support len(), and any longer than maxbytes on their own are not cached.
+    """
+    def __init__(self, timeout, maxsize=128, maxbytes=None):
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self._entries = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            return value
+
+    def set(self, key, value):
+        size = len(value) if self.maxbytes is not None else 0
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._remove(key)
+            # Entries share one timeout, so the oldest are the first to expire. Drop
+            # those that have, then keep evicting until the new entry fits.
+            while self._entries:
+                oldest_key = next(iter(self._entries))
+                if self._entries[oldest_key][0] > now and not self._is_full(size):
+                    break
+                self._remove(oldest_key)
+            self._entries[key] = (now + self.timeout, value)
+            self._size += size
+
+    def _is_full(self, size):
+        if len(self._entries) >= self.maxsize:
+            return True
+        return self.maxbytes is not None and self._size + size > self.maxbytes
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and self.maxbytes is not None:
+            self._size -= len(entry[1])
+
+def cached_route(timeout=30):
+    """
+    A decorator that caches a route's return value per user for a short time.
+
+    Entries are keyed on the user's access token and the full request path, so
+    repeat hits on read-only routes skip the Spotify API entirely.
+
+    Parameters:
+    - timeout (int): Seconds a cached response stays valid.
+
+    Returns:
+    - decorator (function): The decorator to apply.
+    """
+    cache = TTLCache(timeout)
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # Loaded by the app's before_request hooks, along with the Spotify client
+            token = g.get('spotify_token')
+            if token is None:
+                return func(*args, **kwargs)
+            key = (token.access_token, request.full_path)
+            value = cache.get(key)
+            if value is None:
+                value = func(*args, **kwargs)
+                # Only cache data, not redirects or other responses
+                if isinstance(value, (dict, list)):
+                    cache.set(key, value)
+            return value
+        return wrapper
+    return decorator
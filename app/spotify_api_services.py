@@ -1,4 +1,15 @@
 import spotipy
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Shared pool for overlapping independent Spotify API requests
+executor = ThreadPoolExecutor(max_workers=32)
+
+# Requests a single call keeps in flight, well under the pool size so one large
+# playlist or library can't hold up every other request in the worker
+PAGE_PREFETCH = 4
+BATCH_CONCURRENCY = 4
 
 def with_pagination(func):
     """
@@ -11,13 +22,107 @@ def with_pagination(func):
     - wrapper (function): The decorated function.
     """
     def wrapper(sp, *args, **kwargs):
-        items = []
-        results = func(sp, *args, **kwargs)
+        return list(iter_paginated_items(sp, func(sp, *args, **kwargs)))
+    return wrapper
+
+def iter_paginated_items(sp, results):
+    """
+    Yields the items of a paginated Spotify API response.
+
+    For offset-based responses, the remaining page offsets are known from the
+    first page, so up to PAGE_PREFETCH pages are fetched concurrently ahead of
+    the one being yielded. Cursor-based responses are followed page by page.
+
+    Parameters:
+    - sp (Spotify): An instance of the Spotify class.
+    - results (dict): The first page of the response.
+
+    Yields:
+    - dict: Each item across all pages, in order.
+    """
+    if 'offset' not in results or 'total' not in results:
         while results:
-            items.extend(results['items'])
+            yield from results['items']
             results = sp.next(results) if results['next'] else None
-        return items
-    return wrapper
+        return
+
+    yield from results['items']
+    if not results['next']:
+        return
+    limit = results['limit']
+    urls = (page_url(results['next'], offset) for offset in range(results['offset'] + limit, results['total'], limit))
+    for page in map_concurrently(sp._get, urls, PAGE_PREFETCH):
+        yield from page['items']
+
+def map_concurrently(func, iterable, limit):
+    """
+    Yields func(item) for each item, in order, with calls run on the shared executor.
+
+    At most limit calls from one map_concurrently are in flight at a time, so
+    concurrent callers share the executor instead of one of them filling it.
+
+    Parameters:
+    - func (function): The function to call for each item.
+    - iterable (iterable): The items to call it with.
+    - limit (int): The maximum number of calls in flight at once.
+
+    Yields:
+    - object: The result of each call, in the order of the items.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def page_url(url, offset):
+    """
+    Returns a paginated Spotify API URL with its offset replaced.
+
+    Parameters:
+    - url (str): A page URL, such as a response's 'next' link.
+    - offset (int): The offset of the page to request.
+
+    Returns:
+    - str: The URL of the page at the given offset.
+    """
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query['offset'] = offset
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def with_batching(batch_size, key=None):
+    """
+    A decorator that splits a list of IDs into batches the Spotify API accepts.
+
+    Duplicate IDs are only requested once, batches are fetched concurrently,
+    and the results are re-expanded to match the order of the IDs passed in.
+
+    Parameters:
+    - batch_size (int): The maximum number of IDs per API request.
+    - key (str): The key holding the result list in the response, if any.
+
+    Returns:
+    - decorator (function): The decorator to apply.
+    """
+    def decorator(func):
+        def wrapper(sp, ids, *args, **kwargs):
+            unique_ids = list(dict.fromkeys(ids))
+            batches = [unique_ids[i:i + batch_size] for i in range(0, len(unique_ids), batch_size)]
+            def fetch(batch):
+                return func(sp, batch, *args, **kwargs)
+            if len(batches) > 1:
+                responses = map_concurrently(fetch, batches, BATCH_CONCURRENCY)
+            else:
+                responses = map(fetch, batches)
+            results_by_id = {}
+            for batch, results in zip(batches, responses):
+                results_by_id.update(zip(batch, results[key] if key else results))
+            return [results_by_id[id] for id in ids]
+        return wrapper
+    return decorator
 
 def get_user(sp):
     """
@@ -48,6 +153,19 @@ def get_playlist(sp, playlist_id):
     """
     return sp.playlist(playlist_id)
 
+def get_playlist_snapshot_id(sp, playlist_id):
+    """
+    Retrieves only the snapshot ID of a Spotify playlist, which changes whenever the playlist is modified.
+
+    Parameters:
+    sp (object): The Spotify object used for authentication and API calls.
+    playlist_id (str): The ID of the playlist.
+
+    Returns:
+    str: The playlist's current snapshot ID.
+    """
+    return sp.playlist(playlist_id, fields='snapshot_id')['snapshot_id']
+
 @with_pagination
 def get_playlist_items(sp, playlist_id):
     """
@@ -62,6 +180,22 @@ def get_playlist_items(sp, playlist_id):
     """
     return sp.playlist_items(playlist_id)
 
+def iter_playlist_items(sp, playlist_id):
+    """
+    Lazily iterates over the items in a Spotify playlist.
+
+    The first page is requested immediately, so errors surface before iteration;
+    later pages are only requested as the iterator reaches them.
+
+    Args:
+        sp (object): The Spotify API object.
+        playlist_id (str): The ID of the playlist.
+
+    Returns:
+        iterator: An iterator over the playlist items.
+    """
+    return iter_paginated_items(sp, sp.playlist_items(playlist_id))
+
 def get_playlist_cover_image(sp, playlist_id):
     """
     Retrieves the cover image of a Spotify playlist.
@@ -88,6 +222,7 @@ def get_track(sp, track_id):
     """
     return sp.track(track_id)
 
+@with_batching(50, key='tracks')
 def get_several_tracks(sp, track_ids):
     """
     Retrieves several tracks from Spotify API based on their track IDs.
@@ -97,7 +232,7 @@ def get_several_tracks(sp, track_ids):
     track_ids (list): A list of track IDs.
 
     Returns:
-    dict: A dictionary containing information about the retrieved tracks.
+    list: A list containing information about each of the retrieved tracks.
     """
     return sp.tracks(track_ids)
 
@@ -112,8 +247,23 @@ def get_saved_tracks(sp):
     Returns:
         dict: A dictionary containing information about the saved tracks.
     """
-    return sp.current_user_saved_tracks()
+    return sp.current_user_saved_tracks(limit=50)
+
+def iter_saved_tracks(sp):
+    """
+    Lazily iterates over the saved tracks of the current user.
+
+    The first page is requested immediately, so errors surface before iteration.
+
+    Args:
+        sp (object): The Spotify object used for making API requests.
+
+    Returns:
+        iterator: An iterator over the saved tracks.
+    """
+    return iter_paginated_items(sp, sp.current_user_saved_tracks(limit=50))
 
+@with_batching(100)
 def get_several_audio_features(sp, track_ids):
     return sp.audio_features(track_ids)
 
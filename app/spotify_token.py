@@ -0,0 +1,33 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass
+class SpotifyToken:
+    """
+    The parts of a Spotify OAuth token the app keeps in the session.
+
+    Attributes:
+    - access_token (str): The bearer token sent with API requests.
+    - refresh_token (str): The token used to obtain a new access token, if any.
+    - expires_at (int): Unix timestamp at which the access token expires, if known.
+    """
+    access_token: str
+    refresh_token: Optional[str] = None
+    expires_at: Optional[int] = None
+
+    @classmethod
+    def from_mapping(cls, token):
+        """
+        Builds a SpotifyToken from a token dict, e.g. one returned by Authlib or stored in the session.
+
+        Parameters:
+        - token (dict): A mapping with at least an 'access_token' key.
+
+        Returns:
+        - SpotifyToken: The token, with expires_at derived from expires_in when missing.
+        """
+        expires_at = token.get('expires_at')
+        if expires_at is None and token.get('expires_in') is not None:
+            expires_at = int(time.time()) + int(token['expires_in'])
+        return cls(token['access_token'], token.get('refresh_token'), expires_at)
@@ -1,3 +1,5 @@
+import sys
+
 def print_playlist_structure(data, indent=2):
     for key, value in data.items():
         print(" " * indent + f"{key}: {type(value)}")
@@ -23,11 +25,18 @@ def print_cover_image_structure(cover_image):
     #     print(type(item).__name__)
     #     print(f"  {item}: {type(item).__name__}")
 
-def print_structure(data, indent=0):
-    if isinstance(data, dict):
-        for key, value in data.items():
-            print('  ' * indent + str(key) + ':', type(value))
-            print_structure(value, indent + 1)
-    elif isinstance(data, list) and data and isinstance(data[0], dict):
-        for item in data:
-            print_structure(item, indent + 1)
\ No newline at end of file
+def print_structure(data, indent=0, file=None):
+    # Walk with an explicit stack and write once at the end, since payloads like top tracks are large and deeply nested
+    lines = []
+    stack = [(None, data, indent)]
+    while stack:
+        line, node, level = stack.pop()
+        if line is not None:
+            lines.append(line)
+        if isinstance(node, dict):
+            for key, value in reversed(list(node.items())):
+                stack.append(('  ' * level + f"{key}: {type(value)}\n", value, level + 1))
+        elif isinstance(node, list) and node and isinstance(node[0], dict):
+            for item in reversed(node):
+                stack.append((None, item, level + 1))
+    (file or sys.stdout).write(''.join(lines))
\ No newline at end of file
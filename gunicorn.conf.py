@@ -0,0 +1,16 @@
+# Gunicorn settings, picked up automatically when running `gunicorn` from the repository root
+
+# Patch the standard library for gevent before the app, with its HTTP session and thread pools, is preloaded
+from gevent import monkey
+monkey.patch_all()
+
+chdir = 'app'
+wsgi_app = 'app:app'
+
+# Every route blocks on Spotify API calls, so use greenlet workers that yield during network I/O
+worker_class = 'gevent'
+workers = 4
+worker_connections = 1000
+
+# Load the app once in the master so workers share the OAuth client and HTTP session setup
+preload_app = True
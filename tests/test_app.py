@@ -0,0 +1,251 @@
+import gc
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+import orjson
+from flask import jsonify
+
+# Sign sessions so requests go through the login middleware's cookie check
+os.environ.setdefault('APP_SECRET_KEY', 'test')
+
+import app
+from response_cache import TTLCache
+from spotify_token import SpotifyToken
+
+
+class SpotifyClientTests(unittest.TestCase):
+    def test_collected_client_leaves_shared_pool_open(self):
+        adapter = app.http_session.get_adapter('https://api.spotify.com')
+        adapter.poolmanager.connection_from_url('https://api.spotify.com')
+        self.assertEqual(len(adapter.poolmanager.pools), 1)
+
+        sp = app.SharedSessionSpotify(auth='token', requests_session=app.http_session)
+        del sp
+        gc.collect()
+
+        self.assertEqual(len(adapter.poolmanager.pools), 1)
+
+    def test_clients_are_reused_per_access_token(self):
+        self.assertIs(app.make_spotify_client('a'), app.make_spotify_client('a'))
+        self.assertIsNot(app.make_spotify_client('a'), app.make_spotify_client('b'))
+
+
+class LoginTests(unittest.TestCase):
+    def test_logged_out_request_redirects_to_login(self):
+        response = app.app.test_client().get('/user/playlists')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.location, '/login')
+
+    def test_public_paths_match_public_endpoints(self):
+        paths, _ = app.app.wsgi_app.read_public_paths()
+        self.assertEqual(paths, {'/', '/login', '/authorize'})
+
+
+
+def drain_token_refreshes():
+    # The refresh pool has one worker, so once this no-op runs every earlier
+    # refresh and its done-callback has finished
+    app.token_refresh_executor.submit(lambda: None).result(timeout=5)
+
+
+class TokenRefreshTests(unittest.TestCase):
+    def setUp(self):
+        for target, value in [('pending_token_refreshes', {}), ('refreshed_tokens', TTLCache(timeout=300))]:
+            patcher = mock.patch.object(app, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(app, 'refresh_token')
+        self.refresh_token = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+
+    def set_session_token(self, expires_in):
+        with self.client.session_transaction() as session:
+            session['spotify_token'] = {'access_token': 'old', 'refresh_token': 'r', 'expires_at': int(time.time()) + expires_in}
+
+    def session_token(self):
+        with self.client.session_transaction() as session:
+            return session.get('spotify_token')
+
+    def test_near_expiry_schedules_one_refresh_and_keeps_old_client(self):
+        release = threading.Event()
+        def slow_refresh(token):
+            release.wait(timeout=5)
+            return SpotifyToken('new', 'r', int(time.time()) + 3600)
+        self.refresh_token.side_effect = slow_refresh
+        token = {'access_token': 'old', 'refresh_token': 'r', 'expires_at': int(time.time()) + 30}
+
+        clients = []
+        for _ in range(3):
+            with app.app.test_request_context():
+                app.session['spotify_token'] = token
+                clients.append(app.create_spotify_client())
+        self.assertEqual(list(app.pending_token_refreshes), ['r'])
+
+        release.set()
+        drain_token_refreshes()
+        self.assertEqual(self.refresh_token.call_count, 1)
+        self.assertTrue(all(sp is app.make_spotify_client('old') for sp in clients))
+        self.assertEqual(app.pending_token_refreshes, {})
+
+    def test_next_request_picks_up_refreshed_token(self):
+        self.refresh_token.return_value = SpotifyToken('new', 'r', int(time.time()) + 3600)
+        self.set_session_token(30)
+        with mock.patch.object(app, 'get_followed_artists', return_value=[]):
+            self.assertEqual(self.client.get('/user/followed_artists').status_code, 200)
+            drain_token_refreshes()
+            self.assertEqual(self.session_token()['access_token'], 'old')
+
+            self.assertEqual(self.client.get('/user/followed_artists').status_code, 200)
+        self.assertEqual(self.session_token()['access_token'], 'new')
+        self.assertEqual(self.refresh_token.call_count, 1)
+
+    def test_expired_token_refreshes_before_the_request(self):
+        self.refresh_token.return_value = SpotifyToken('new', 'r', int(time.time()) + 3600)
+        with app.app.test_request_context():
+            app.session['spotify_token'] = {'access_token': 'old', 'refresh_token': 'r', 'expires_at': int(time.time()) - 1}
+            sp = app.create_spotify_client()
+            self.assertEqual(app.session['spotify_token']['access_token'], 'new')
+        self.assertIs(sp, app.make_spotify_client('new'))
+        self.assertEqual(self.refresh_token.call_count, 1)
+        self.assertEqual(app.pending_token_refreshes, {})
+
+    def test_failed_refresh_of_expired_token_logs_out(self):
+        self.refresh_token.side_effect = app.OAuthError('invalid_grant')
+        self.set_session_token(-1)
+        response = self.client.get('/user/followed_artists')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.location, '/login')
+        self.assertIsNone(self.session_token())
+
+    def test_failed_background_refresh_is_logged(self):
+        self.refresh_token.side_effect = app.OAuthError('invalid_grant')
+        with self.assertLogs(app.app.logger, level='WARNING') as logs:
+            app.schedule_token_refresh(SpotifyToken('old', 'r', int(time.time()) + 30))
+            drain_token_refreshes()
+        self.assertIn('token refresh failed', logs.output[0])
+        self.assertEqual(app.pending_token_refreshes, {})
+        self.assertIsNone(app.refreshed_tokens.get('r'))
+
+
+
+class PlaylistItemsTests(unittest.TestCase):
+    PLAYLIST_ID = '37i9dQZF1DXcBWIGoYBM5M'
+    BODY = b'{"n":1}\n{"n":2}\n'
+
+    def setUp(self):
+        self.cache = TTLCache(timeout=3600, maxbytes=1024)
+        self.fetches = []
+        def iter_items(sp, playlist_id):
+            self.fetches.append(playlist_id)
+            yield {'n': 1}
+            yield {'n': 2}
+        for target, value in [
+            ('playlist_items_cache', self.cache),
+            ('iter_playlist_items', iter_items),
+            ('get_playlist_snapshot_id', lambda sp, playlist_id: 'snap'),
+        ]:
+            patcher = mock.patch.object(app, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+        with self.client.session_transaction() as session:
+            session['spotify_token'] = {'access_token': 'a', 'refresh_token': 'r', 'expires_at': int(time.time()) + 3600}
+
+    def get_items(self, query=''):
+        return self.client.get(f'/playlist/{self.PLAYLIST_ID}/items{query}')
+
+    def test_miss_streams_then_caches_body(self):
+        response = self.get_items()
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual(response.data, self.BODY)
+        self.assertEqual(self.cache.get((self.PLAYLIST_ID, 'snap')), self.BODY)
+
+    def test_hit_returns_cached_body(self):
+        self.cache.set((self.PLAYLIST_ID, 'snap'), b'{"cached":true}\n')
+        response = self.get_items('?refresh=0')
+        self.assertEqual(response.data, b'{"cached":true}\n')
+        self.assertEqual(self.fetches, [])
+
+    def test_refresh_bypasses_cache(self):
+        self.cache.set((self.PLAYLIST_ID, 'snap'), b'{"cached":true}\n')
+        self.assertEqual(self.get_items('?refresh=1').data, self.BODY)
+        self.assertEqual(self.fetches, [self.PLAYLIST_ID])
+        self.assertEqual(self.cache.get((self.PLAYLIST_ID, 'snap')), self.BODY)
+
+    def test_body_over_budget_is_streamed_but_not_cached(self):
+        self.cache.maxbytes = len(self.BODY) - 1
+        self.assertEqual(self.get_items().data, self.BODY)
+        self.assertIsNone(self.cache.get((self.PLAYLIST_ID, 'snap')))
+
+    def test_cache_without_byte_budget(self):
+        cache = TTLCache(timeout=10)
+        self.assertEqual(list(app.cache_when_exhausted(iter([b'a', b'b']), cache, 'key')), [b'a', b'b'])
+        self.assertEqual(cache.get('key'), b'ab')
+
+
+
+class ConditionalResponseTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(app, 'get_user', return_value={'id': 'u'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+        with self.client.session_transaction() as session:
+            session['spotify_token'] = {'access_token': 'conditional', 'expires_at': int(time.time()) + 3600}
+
+    def test_json_response_gets_private_etag(self):
+        response = self.client.get('/user')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertTrue(response.cache_control.private)
+
+    def test_matching_etag_gets_empty_304(self):
+        etag = self.client.get('/user').headers['ETag']
+        response = self.client.get('/user', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_stale_etag_gets_full_response(self):
+        response = self.client.get('/user', headers={'If-None-Match': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'{"id":"u"}')
+
+    def test_streamed_response_gets_no_etag(self):
+        with mock.patch.object(app, 'playlist_items_cache', TTLCache(timeout=10, maxbytes=1024)), \
+                mock.patch.object(app, 'get_playlist_snapshot_id', return_value='snap'), \
+                mock.patch.object(app, 'iter_playlist_items', return_value=iter([{'n': 1}])):
+            response = self.client.get('/playlist/37i9dQZF1DXcBWIGoYBM5M/items')
+        self.assertTrue(response.is_streamed)
+        self.assertIsNone(response.headers.get('ETag'))
+
+
+
+class JsonResponseTests(unittest.TestCase):
+    def assert_orjson_body(self, response, obj):
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(response.data, orjson.dumps(obj, option=app.ORJSON_OPTIONS))
+
+    def test_jsonify_matches_orjson(self):
+        obj = {'id': 'u', 'name': 'caf\u00e9', 'images': [], 1: None}
+        with app.app.app_context():
+            self.assert_orjson_body(jsonify(obj), obj)
+            self.assert_orjson_body(jsonify(1, 2), [1, 2])
+            self.assert_orjson_body(jsonify(a=1), {'a': 1})
+            self.assert_orjson_body(jsonify(), None)
+
+    def test_dict_return_matches_orjson(self):
+        obj = {'id': 'u', 'followers': {'total': 3}, 2: 'non-string key'}
+        client = app.app.test_client()
+        with client.session_transaction() as session:
+            session['spotify_token'] = {'access_token': 'json', 'expires_at': int(time.time()) + 3600}
+        with mock.patch.object(app, 'get_user', return_value=obj):
+            self.assert_orjson_body(client.get('/user'), obj)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import unittest
+
+from flask import Flask
+
+from login_middleware import LoginRequiredMiddleware
+
+
+def make_app():
+    # The tests directory doubles as the static folder, so the static route exists
+    app = Flask(__name__, static_folder=os.path.dirname(os.path.abspath(__file__)), static_url_path='/static')
+    app.secret_key = 'test'
+    app.url_map.strict_slashes = False
+
+    @app.route('/')
+    def index():
+        return 'index'
+
+    @app.route('/login')
+    def login():
+        return 'login'
+
+    @app.route('/data')
+    def data():
+        return 'data'
+
+    app.wsgi_app = LoginRequiredMiddleware(app.wsgi_app, app, {'index', 'login', 'static'})
+    return app
+
+
+def set_session_cookie(client, data, secret_key='test'):
+    signing_app = Flask(__name__)
+    signing_app.secret_key = secret_key
+    value = signing_app.session_interface.get_signing_serializer(signing_app).dumps(data)
+    client.set_cookie('session', value)
+
+
+class LoginRequiredMiddlewareTests(unittest.TestCase):
+    def setUp(self):
+        self.app = make_app()
+        self.client = self.app.test_client()
+
+    def test_public_paths_pass_without_session(self):
+        self.assertEqual(self.client.get('/').data, b'index')
+        self.assertEqual(self.client.get('/login').data, b'login')
+        self.assertEqual(self.client.get('/login/').data, b'login')
+
+    def test_static_files_pass_without_session(self):
+        response = self.client.get('/static/__init__.py')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_missing_session_redirects_to_login(self):
+        response = self.client.get('/data')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.location, '/login')
+
+    def test_redirect_keeps_script_name(self):
+        response = self.client.get('/data', base_url='http://localhost/vault')
+        self.assertEqual(response.location, '/vault/login')
+
+    def test_session_with_token_passes(self):
+        set_session_cookie(self.client, {'spotify_token': {'access_token': 'a'}})
+        self.assertEqual(self.client.get('/data').data, b'data')
+
+    def test_session_without_token_redirects(self):
+        set_session_cookie(self.client, {'other': 1})
+        self.assertEqual(self.client.get('/data').status_code, 302)
+
+    def test_bad_signature_redirects(self):
+        set_session_cookie(self.client, {'spotify_token': {'access_token': 'a'}}, secret_key='other')
+        self.assertEqual(self.client.get('/data').status_code, 302)
+
+    def test_public_paths_come_from_url_map(self):
+        middleware = self.app.wsgi_app
+        self.assertEqual(middleware.read_public_paths(), ({'/', '/login'}, ('/static/',)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from unittest import mock
+
+from response_cache import TTLCache
+
+
+class TTLCacheTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('response_cache.time.monotonic', return_value=0)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_returns_value_until_expiry(self):
+        cache = TTLCache(timeout=10)
+        cache.set('a', 1)
+        self.monotonic.return_value = 9
+        self.assertEqual(cache.get('a'), 1)
+        self.monotonic.return_value = 10
+        self.assertIsNone(cache.get('a'))
+
+    def test_set_purges_expired_entries(self):
+        cache = TTLCache(timeout=10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.monotonic.return_value = 10
+        cache.set('c', 3)
+        self.assertEqual(list(cache._entries), ['c'])
+
+    def test_maxsize_evicts_oldest(self):
+        cache = TTLCache(timeout=10, maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_setting_a_key_again_replaces_it(self):
+        cache = TTLCache(timeout=10, maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('a', 3)
+        cache.set('c', 4)
+        self.assertEqual(cache.get('a'), 3)
+        self.assertIsNone(cache.get('b'))
+
+    def test_maxbytes_evicts_oldest(self):
+        cache = TTLCache(timeout=10, maxbytes=10)
+        cache.set('a', b'12345')
+        cache.set('b', b'12345')
+        cache.set('c', b'123')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), b'12345')
+        self.assertEqual(cache._size, 8)
+
+    def test_value_over_maxbytes_is_not_cached(self):
+        cache = TTLCache(timeout=10, maxbytes=4)
+        cache.set('a', b'1234')
+        cache.set('b', b'12345')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1234')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+from urllib.parse import parse_qs, urlsplit
+
+from spotify_api_services import iter_paginated_items, map_concurrently, page_url, with_batching
+
+BASE_URL = 'https://api.spotify.com/v1/me/tracks'
+
+
+class FakeSpotify:
+    """
+    Serves offset-paginated pages over the items 0..total-1.
+    """
+    def __init__(self, total, limit):
+        self.total = total
+        self.limit = limit
+        self.requested = []
+
+    def page(self, offset):
+        next_offset = offset + self.limit
+        return {
+            'items': list(range(offset, min(next_offset, self.total))),
+            'offset': offset,
+            'limit': self.limit,
+            'total': self.total,
+            'next': f'{BASE_URL}?offset={next_offset}&limit={self.limit}' if next_offset < self.total else None,
+        }
+
+    def _get(self, url):
+        offset = int(parse_qs(urlsplit(url).query)['offset'][0])
+        self.requested.append(offset)
+        return self.page(offset)
+
+
+class CursorSpotify:
+    """
+    Serves cursor-paginated pages, which carry no offset or total.
+    """
+    def __init__(self, pages):
+        self.pages = pages
+
+    def first(self):
+        return {'items': self.pages[0], 'next': 'cursor-1' if len(self.pages) > 1 else None}
+
+    def next(self, results):
+        index = int(results['next'].split('-')[1])
+        return {'items': self.pages[index], 'next': f'cursor-{index + 1}' if index + 1 < len(self.pages) else None}
+
+
+class PaginationTests(unittest.TestCase):
+    def test_offset_pages_are_yielded_in_order(self):
+        sp = FakeSpotify(total=23, limit=5)
+        self.assertEqual(list(iter_paginated_items(sp, sp.page(0))), list(range(23)))
+        self.assertEqual(sorted(sp.requested), [5, 10, 15, 20])
+
+    def test_single_page_makes_no_requests(self):
+        sp = FakeSpotify(total=3, limit=5)
+        self.assertEqual(list(iter_paginated_items(sp, sp.page(0))), [0, 1, 2])
+        self.assertEqual(sp.requested, [])
+
+    def test_exact_multiple_of_limit(self):
+        sp = FakeSpotify(total=10, limit=5)
+        self.assertEqual(list(iter_paginated_items(sp, sp.page(0))), list(range(10)))
+        self.assertEqual(sp.requested, [5])
+
+    def test_cursor_pages_are_followed(self):
+        sp = CursorSpotify([[1, 2], [3], [4, 5]])
+        self.assertEqual(list(iter_paginated_items(sp, sp.first())), [1, 2, 3, 4, 5])
+
+    def test_page_url_replaces_offset_and_keeps_other_params(self):
+        url = page_url(f'{BASE_URL}?offset=50&limit=50&market=US', 150)
+        self.assertEqual(parse_qs(urlsplit(url).query), {'offset': ['150'], 'limit': ['50'], 'market': ['US']})
+        self.assertTrue(url.startswith(BASE_URL + '?'))
+
+    def test_map_concurrently_keeps_order(self):
+        self.assertEqual(list(map_concurrently(lambda x: x * 2, range(10), 3)), [x * 2 for x in range(10)])
+
+
+class BatchingTests(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+
+        @with_batching(2, key='tracks')
+        def get_tracks(sp, ids):
+            self.batches.append(ids)
+            return {'tracks': [{'id': id} for id in ids]}
+
+        @with_batching(2)
+        def get_features(sp, ids):
+            self.batches.append(ids)
+            return [{'id': id} for id in ids]
+
+        self.get_tracks = get_tracks
+        self.get_features = get_features
+
+    def test_results_follow_request_order_with_duplicates(self):
+        ids = ['c', 'a', 'c', 'b', 'a', 'd', 'e']
+        self.assertEqual(self.get_tracks(None, ids), [{'id': id} for id in ids])
+        self.assertEqual(sorted(self.batches), [['b', 'd'], ['c', 'a'], ['e']])
+
+    def test_unkeyed_results(self):
+        self.assertEqual(self.get_features(None, ['a', 'b', 'a']), [{'id': 'a'}, {'id': 'b'}, {'id': 'a'}])
+        self.assertEqual(self.batches, [['a', 'b']])
+
+    def test_no_ids(self):
+        self.assertEqual(self.get_tracks(None, []), [])
+        self.assertEqual(self.batches, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+from unittest import mock
+
+from spotify_token import SpotifyToken
+
+
+class SpotifyTokenTests(unittest.TestCase):
+    def test_from_mapping_keeps_expires_at(self):
+        token = SpotifyToken.from_mapping({
+            'access_token': 'a', 'refresh_token': 'r', 'expires_at': 100, 'expires_in': 3600,
+        })
+        self.assertEqual(token, SpotifyToken('a', 'r', 100))
+
+    @mock.patch('spotify_token.time.time', return_value=1000.5)
+    def test_from_mapping_derives_expires_at_from_expires_in(self, _):
+        token = SpotifyToken.from_mapping({'access_token': 'a', 'expires_in': '3600'})
+        self.assertEqual(token, SpotifyToken('a', None, 4600))
+
+    def test_from_mapping_without_expiry(self):
+        token = SpotifyToken.from_mapping({'access_token': 'a', 'token_type': 'Bearer'})
+        self.assertEqual(token, SpotifyToken('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()